@@ -1,12 +1,16 @@
 #### Write you dashboard here
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+import hashlib
+import os
+import uuid
 import pandas as pd
 import streamlit as st
 import sqlite3
-import plotly.express as px
+import plotly.graph_objects as go
 
 DB_PATH = "legal_documents_ecommerce.db"
+CACHE_DIR = "cache"
 
 def set_page_config() -> None:
     st.set_page_config(page_title="Legal Desk Analytics Dashboard", page_icon="📑",
@@ -19,48 +23,279 @@ def set_page_config() -> None:
         </style>
     """, unsafe_allow_html=True)
 
+# Order-level facts live in Orders (one row per order), item-level facts in
+# Order_items (one row per item); each query only touches the side it needs.
+ITEMS_JOIN = """
+    FROM   Order_items   AS OI
+    JOIN   Products      AS P  ON P.product_id   = OI.product_id
+"""
+
+ORDER_TOTALS = """
+    SELECT
+        order_id,
+        SUM(quantity * unit_price) AS item_revenue,
+        COUNT(*)                   AS n_items
+    FROM     Order_items
+    GROUP BY order_id
+"""
+
+# Time buckets for the order volume charts, shared by the weekly and monthly
+# queries. SQLite sorts the (few hundred) orders by bucket itself.
+# Julian day numbers are 0 mod 7 on Mondays, so flooring to the week start is
+# plain integer arithmetic instead of building a date modifier string.
+WEEK_START = "date(julianday(order_date) - CAST(julianday(order_date) + 0.5 AS INTEGER) % 7)"
+# order_date is stored as ISO-8601 text, so the month prefix is the bucket key.
+MONTH_START = "substr(order_date, 1, 7) || '-01'"
+
+def temp_path(version: str) -> str:
+    # sessions are threads in one process, so every write gets its own temp
+    # file; it is created by the writer, so the umask applies as usual
+    return os.path.join(CACHE_DIR, f"{version}-{uuid.uuid4().hex}.tmp")
+
+def build_working_copy(version: str) -> str:
+    # Indexes and planner statistics go into a copy under CACHE_DIR, so the
+    # tracked database file is never written to
+    path = os.path.join(CACHE_DIR, f"{version}-dashboard.db")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = temp_path(version)
+    try:
+        source = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        copy = sqlite3.connect(tmp_path)
+        source.backup(copy)
+        source.close()
+        copy.executescript("""
+            -- order_id is the rowid, which every index already stores, so the
+            -- Orders index covers (customer_id, order_id) without naming it
+            CREATE INDEX idx_orders_customer       ON Orders(customer_id);
+            CREATE INDEX idx_items_order_product   ON Order_items(order_id, product_id);
+            CREATE INDEX idx_items_product         ON Order_items(product_id);
+            ANALYZE;
+        """)
+        copy.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+# One connection per database version shared by all sessions, so pragmas and
+# SQLite's page cache carry over between queries
+@st.cache_resource
+def get_connection(version: str) -> sqlite3.Connection:
+    # the dashboard only reads, so the connection is read-only
+    conn = sqlite3.connect(f"file:{build_working_copy(version)}?mode=ro", uri=True, check_same_thread=False)
+    conn.executescript("""
+        PRAGMA cache_size   = -65536;
+        PRAGMA temp_store   = MEMORY;
+        PRAGMA mmap_size    = 268435456;
+    """)
+    return conn
+
+def db_version() -> str:
+    # the dashboard never writes to DB_PATH, so its mtime only changes when
+    # the data does
+    return str(os.stat(DB_PATH).st_mtime_ns)
+
+def prune_snapshots(version: str) -> None:
+    # snapshots, working copies and temp files of older database versions can
+    # never be used again
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith((".parquet", ".db", ".tmp")) and not name.startswith(f"{version}-"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+def run_query(query: str, params: Tuple = (), parse_dates: Optional[List[str]] = None) -> pd.DataFrame:
+    # Results are snapshotted to Parquet per database version, so a restarted
+    # server reads them back without opening SQLite at all.
+    version = db_version()
+    key = hashlib.sha1(repr((query, params, parse_dates)).encode()).hexdigest()
+    path = os.path.join(CACHE_DIR, f"{version}-{key}.parquet")
+    try:
+        return pd.read_parquet(path)
+    except FileNotFoundError:
+        pass
+
+    df = pd.read_sql_query(query, get_connection(version), params=params, parse_dates=parse_dates)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    prune_snapshots(version)
+    tmp_path = temp_path(version)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
+@st.cache_data(show_spinner="Loading KPIs…")
+def load_kpis() -> pd.Series:
+    # Each table is scanned once; the per-order averages come from the
+    # per-order item totals, so they only cover orders that have items
+    query = f"""
+        SELECT
+            *,
+            CAST(total_orders AS REAL) / total_customers  AS orders_per_customer
+        FROM (
+            SELECT
+                COUNT(DISTINCT customer_id) AS total_customers,
+                COUNT(*)                    AS total_orders,
+                MIN(order_date)             AS first_order,
+                MAX(order_date)             AS last_order
+            FROM  Orders AS O
+            -- same orders as the item-level join: with a customer and items
+            WHERE EXISTS (SELECT 1 FROM Customers   AS C  WHERE C.customer_id = O.customer_id)
+              AND EXISTS (SELECT 1 FROM Order_items AS OI WHERE OI.order_id   = O.order_id)
+        )
+        CROSS JOIN (
+            SELECT
+                SUM(item_revenue)           AS total_revenue,
+                SUM(n_items)                AS total_items,
+                AVG(item_revenue)           AS avg_order_value,
+                AVG(n_items)                AS avg_items_per_order
+            FROM ({ORDER_TOTALS})
+        );
+    """
+    return run_query(query, parse_dates=["first_order", "last_order"]).iloc[0]
+
 @st.cache_data(show_spinner="Loading data…")
-def load_data() -> pd.DataFrame:
-    conn = sqlite3.connect(DB_PATH)
+def load_sample(n: int = 5) -> pd.DataFrame:
     query = """
         SELECT
             C.customer_id,
             C.first_name,
             C.last_name,
-            C.registration_date,
             O.order_id,
             O.order_date,
-            O.total_amount,
             P.product_name,
             P.category,
-            P.price,
             OI.quantity,
             OI.unit_price,
             OI.quantity * OI.unit_price     AS item_revenue
         FROM   Customers     AS C
         JOIN   Orders        AS O  ON O.customer_id  = C.customer_id
         JOIN   Order_items   AS OI ON OI.order_id    = O.order_id
-        JOIN   Products      AS P  ON P.product_id   = OI.product_id;
+        JOIN   Products      AS P  ON P.product_id   = OI.product_id
+        LIMIT ?;
     """
+    return run_query(query, (n,), parse_dates=["order_date"])
 
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+@st.cache_data(show_spinner="Loading weekly orders…")
+def load_weekly() -> pd.DataFrame:
+    query = f"""
+        SELECT
+            {WEEK_START} AS week_start,
+            COUNT(*)     AS orders
+        FROM     Orders
+        GROUP BY week_start
+        ORDER BY week_start;
+    """
+    return run_query(query, parse_dates=["week_start"])
+
+@st.cache_data(show_spinner="Loading monthly orders…")
+def load_monthly() -> pd.DataFrame:
+    query = f"""
+        SELECT
+            {MONTH_START} AS month_start,
+            COUNT(*)      AS orders
+        FROM     Orders
+        GROUP BY month_start
+        ORDER BY month_start;
+    """
+    return run_query(query, parse_dates=["month_start"])
 
-    df["order_date"] = pd.to_datetime(df["order_date"])
-    df["registration_date"] = pd.to_datetime(df["registration_date"])
+@st.cache_data(show_spinner="Loading products…")
+def load_product_frequency() -> pd.DataFrame:
+    # one row per (product, order) pair, so a plain COUNT(*) gives the order count
+    query = f"""
+        SELECT
+            product_name,
+            COUNT(*) AS orders
+        FROM (
+            SELECT DISTINCT P.product_name, OI.order_id
+            {ITEMS_JOIN}
+        )
+        GROUP BY product_name
+        ORDER BY orders DESC, product_name;
+    """
+    return run_query(query)
+
+@st.cache_data(show_spinner=False)
+def load_order_share(product_names: Tuple[str, ...]) -> float:
+    placeholders = ", ".join("?" * len(product_names))
+    # only the items of the chosen products are read; the denominator is the
+    # order count already cached with the KPIs. CROSS JOIN keeps Products as
+    # the outer loop, so SQLite looks the items up through idx_items_product
+    # instead of scanning all of Order_items.
+    query = f"""
+        SELECT COUNT(DISTINCT OI.order_id) AS orders
+        FROM   Products      AS P
+        CROSS JOIN Order_items AS OI ON OI.product_id = P.product_id
+        WHERE  P.product_name IN ({placeholders});
+    """
+    orders = run_query(query, product_names).iloc[0]["orders"]
+    return float(orders / load_kpis()["total_orders"])
 
-    df["week_start"] = df["order_date"] - pd.to_timedelta(df["order_date"].dt.dayofweek, unit="d")
-    df["month_start"] = df["order_date"].dt.to_period("M").dt.to_timestamp()
+@st.cache_data(show_spinner="Loading customers…")
+def load_customer_value() -> pd.DataFrame:
+    query = f"""
+        SELECT
+            C.customer_id,
+            C.first_name || ' ' || C.last_name AS customer_name,
+            SUM(OT.item_revenue)               AS item_revenue
+        FROM   Customers     AS C
+        JOIN   Orders        AS O  ON O.customer_id  = C.customer_id
+        JOIN   ({ORDER_TOTALS}) AS OT ON OT.order_id = O.order_id
+        GROUP BY C.customer_id
+        ORDER BY item_revenue DESC;
+    """
+    return run_query(query)
 
-    return df
+@st.cache_data(show_spinner="Loading categories…")
+def load_category_perf() -> pd.DataFrame:
+    query = f"""
+        SELECT
+            category,
+            SUM(item_revenue) AS item_revenue,
+            COUNT(*)          AS orders
+        FROM (
+            SELECT
+                P.category,
+                OI.order_id,
+                SUM(OI.quantity * OI.unit_price) AS item_revenue
+            {ITEMS_JOIN}
+            GROUP BY P.category, OI.order_id
+        )
+        GROUP BY category
+        ORDER BY item_revenue DESC;
+    """
+    return run_query(query)
 
-def calculate_kpis(df: pd.DataFrame) -> List[str]:
-    total_customers      = f"{df['customer_id'].nunique():,}"
-    total_orders         = f"{df['order_id'].nunique():,}"
-    total_revenue        = f"${df['item_revenue'].sum():,.0f}"
-    avg_order_value      = f"${df.groupby('order_id')['item_revenue'].sum().mean():.0f}"
-    orders_per_customer  = f"{df['order_id'].nunique() / df['customer_id'].nunique():.2f}"
-    avg_items_per_order  = f"{df.groupby('order_id').size().mean():.2f}"
+@st.cache_data(show_spinner="Loading products…")
+def load_product_revenue(n: int = 10) -> pd.DataFrame:
+    query = f"""
+        SELECT
+            P.product_name,
+            P.category,
+            SUM(OI.quantity * OI.unit_price) AS item_revenue
+        {ITEMS_JOIN}
+        GROUP BY P.product_name, P.category
+        ORDER BY item_revenue DESC
+        LIMIT ?;
+    """
+    return run_query(query, (n,))
+
+def calculate_kpis(kpis: pd.Series) -> List[str]:
+    total_customers      = f"{kpis['total_customers']:,}"
+    total_orders         = f"{kpis['total_orders']:,}"
+    total_revenue        = f"${kpis['total_revenue']:,.0f}"
+    avg_order_value      = f"${kpis['avg_order_value']:.0f}"
+    orders_per_customer  = f"{kpis['orders_per_customer']:.2f}"
+    avg_items_per_order  = f"{kpis['avg_items_per_order']:.2f}"
 
     return [
         total_customers,
@@ -82,7 +317,7 @@ def display_kpi_metrics(kpi_values: List[str], kpi_names: List[str]) -> None:
     metric_row(kpi_values[4:],  kpi_names[4:], n_cols=2)
 
 
-def overview_page(df: pd.DataFrame) -> None:
+def overview_page() -> None:
     st.header("Business/data Overview")
     kpi_names = [
         "Total Customers",
@@ -92,27 +327,55 @@ def overview_page(df: pd.DataFrame) -> None:
         "Orders per Customer",
         "Avg Items per Order",
     ]
-    kpi_vals = calculate_kpis(df)
-    display_kpi_metrics(kpi_vals, kpi_names)
+    kpis = load_kpis()
+    # formatted values stick in the session across page switches and are only
+    # rebuilt when the underlying data changes
+    kpi_key = (kpis["total_orders"], kpis["last_order"])
+    if st.session_state.get("kpi_key") != kpi_key:
+        st.session_state["kpi_vals"] = calculate_kpis(kpis)
+        st.session_state["kpi_key"] = kpi_key
+    display_kpi_metrics(st.session_state["kpi_vals"], kpi_names)
 
     st.subheader("Dataset Information")
-    st.write(f"**Date Range:** {df['order_date'].min().date()} ➜ {df['order_date'].max().date()}")
-    st.write(f"**Total Records:** {len(df):,}")
+    st.write(f"**Date Range:** {kpis['first_order'].date()} ➜ {kpis['last_order'].date()}")
+    st.write(f"**Total Records:** {kpis['total_items']:,}")
 
     with st.expander("▶ Sample data (first 5 rows)"):
-        st.dataframe(df.head())
+        st.dataframe(load_sample(5))
+
+def order_volume_figure(x: pd.Series, y: pd.Series, title: str, xaxis_title: str) -> go.Figure:
+    return go.Figure(
+        go.Scattergl(x=x.to_numpy(), y=y.to_numpy(), mode="lines+markers", fill="tozeroy",
+                     hovertemplate=f"{x.name}=%{{x}}<br>{y.name}=%{{y}}<extra></extra>"),
+        layout=dict(title=title, xaxis_title=xaxis_title, yaxis_title="Number of Orders"),
+    )
+
+# Moving the slider only reruns this block, not the whole analysis page
+@st.fragment
+def top_products_fragment(prod_freq: pd.DataFrame) -> None:
+    top_n = st.slider("Show top N products", 5, 30, 10)
+
+    top = prod_freq.head(top_n)
+    max_orders = prod_freq["orders"].max()
+    fig = go.Figure(
+        go.Bar(x=top["product_name"].to_numpy(), y=top["orders"].to_numpy(), text=top["orders"].to_numpy(),
+               hovertemplate="product_name=%{x}<br>orders=%{y}<extra></extra>",
+               textposition="outside", cliponaxis=False),
+        layout=dict(title=f"Top {top_n} Products by Order Count", xaxis_title="product_name",
+                    yaxis_title="orders", yaxis_range=[0, max_orders + 5], xaxis_tickangle=45,
+                    margin=dict(t=90)),
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
-def analysis_page(df: pd.DataFrame) -> None:
+def analysis_page() -> None:
     st.header("Required Task Analysis")
     st.subheader("1. Orders Development Over Time")
     
     # Weekly analysis
-    weekly = (df.groupby("week_start")["order_id"].nunique().reset_index(name="orders"))
+    weekly = load_weekly()
     
-    fig_week = px.line(weekly, x="week_start", y="orders", markers=True, 
-                       title="Weekly Order Volume")
-    fig_week.update_traces(fill='tozeroy')
-    fig_week.update_layout(xaxis_title="Week (Mon–Sun)", yaxis_title="Number of Orders")
+    fig_week = order_volume_figure(weekly["week_start"], weekly["orders"],
+                                   "Weekly Order Volume", "Week (Mon–Sun)")
     st.plotly_chart(fig_week, use_container_width=True)
 
     st.info(
@@ -124,12 +387,9 @@ def analysis_page(df: pd.DataFrame) -> None:
         f"avg {weekly['orders'].mean():.1f} per week."
     )
 
-    monthly = (df.groupby("month_start")["order_id"].nunique().reset_index(name="orders"))
-    fig_month = px.line(monthly, x="month_start", y="orders", markers=True, 
-                        title="Monthly Order Volume")
-    fig_month.update_traces(fill='tozeroy')
-    fig_month.update_layout(xaxis_title="Month", yaxis_title="Number of Orders")
-    
+    monthly = load_monthly()
+    fig_month = order_volume_figure(monthly["month_start"], monthly["orders"],
+                                    "Monthly Order Volume", "Month")
     st.plotly_chart(fig_month, use_container_width=True)
 
     st.info(
@@ -140,42 +400,31 @@ def analysis_page(df: pd.DataFrame) -> None:
     )
 
     st.subheader("2. Most Frequently Ordered Products")
-    top_n = st.slider("Show top N products", 5, 30, 10)
-
-    prod_freq = (df.groupby("product_name")["order_id"].nunique().reset_index(name="orders").sort_values("orders", ascending=False))
-    fig = px.bar(prod_freq.head(top_n), x="product_name", y="orders", text="orders", title=f"Top {top_n} Products by Order Count")
-    
-    max_orders = prod_freq["orders"].max()
-    fig.update_traces(textposition="outside", cliponaxis=False)      
-    fig.update_yaxes(range=[0, max_orders + 5])                
-    fig.update_layout(xaxis_tickangle=45, margin=dict(t=90))        
-    st.plotly_chart(fig, use_container_width=True)
+    prod_freq = load_product_frequency()
+    top_products_fragment(prod_freq)
 
     if not prod_freq.empty:
         top_two = prod_freq.head(2)["product_name"].tolist()  
-        combined_share = (
-            df.loc[df["product_name"].isin(top_two), "order_id"].nunique()
-            / df["order_id"].nunique()
-        )
+        combined_share = load_order_share(tuple(top_two))
         st.info(
             rf"**Observation:** Top products '{top_two[0]}' and '{top_two[1]}' each record "
             f"{prod_freq.iloc[0]['orders']} orders and together they appear in "
             rf"$\approx {combined_share*100:.0f}\%$ of all orders."
         )
 
-def insights_page(df: pd.DataFrame) -> None:
+def insights_page() -> None:
     st.header("Additional BI")
 
     st.subheader("Customer Value Analysis")
-    cust_val = (df.groupby(["customer_id", "first_name", "last_name"]).agg(
-            item_revenue=("item_revenue", "sum"),
-            orders       =("order_id",    "nunique"),
-            quantity     =("quantity",    "sum"),).reset_index().sort_values("item_revenue", ascending=False))
-    cust_val["customer_name"] = cust_val["first_name"] + " " + cust_val["last_name"]
-
-    fig = px.bar(cust_val.head(10), x="customer_name", y="item_revenue",title="Top 10 Customers by Total Revenue",
-                 labels={"item_revenue": "Total Revenue ($)", "customer_name": "Customer"})
-    fig.update_layout(xaxis_tickangle=45)
+    cust_val = load_customer_value()
+
+    top_customers = cust_val.head(10)
+    fig = go.Figure(
+        go.Bar(x=top_customers["customer_name"].to_numpy(), y=top_customers["item_revenue"].to_numpy(),
+               hovertemplate="Customer=%{x}<br>Total Revenue ($)=%{y}<extra></extra>"),
+        layout=dict(title="Top 10 Customers by Total Revenue", xaxis_title="Customer",
+                    yaxis_title="Total Revenue ($)", xaxis_tickangle=45),
+    )
     st.plotly_chart(fig, use_container_width=True)
 
     # values are from the notebook
@@ -191,37 +440,42 @@ def insights_page(df: pd.DataFrame) -> None:
     'Personal': '#FFB6C1',       
     'Intellectual Property': '#FF6B6B'  
     }
+    other_color = '#D3D3D3'  # categories without an entry above
 
     st.subheader("Product Category Analysis")
-    category_perf = (df.groupby("category").agg(
-            item_revenue=("item_revenue", "sum"),
-            quantity     =("quantity",    "sum"),
-            orders       =("order_id",    "nunique"),
-        ).reset_index().sort_values("item_revenue", ascending=False))
+    category_perf = load_category_perf()
 
     col1, col2 = st.columns([2, 1])
     with col1:
-        pie = px.pie(category_perf, names="category", values="item_revenue",
-                     title="Revenue Distribution by Category",
-                     color="category", color_discrete_map=category_colors)
+        pie = go.Figure(
+            go.Pie(labels=category_perf["category"].to_numpy(), values=category_perf["item_revenue"].to_numpy(),
+                   marker_colors=category_perf["category"].map(category_colors).fillna(other_color).to_numpy(),
+                   hovertemplate="category=%{label}<br>item_revenue=%{value}<extra></extra>"),
+            layout=dict(title="Revenue Distribution by Category"),
+        )
         st.plotly_chart(pie, use_container_width=True)
 
     with col2:
         st.markdown("### Category KPIs")
-        for _, row in category_perf.iterrows():
-            st.metric(row["category"], f"${row['item_revenue']:,.0f}", f"{row['orders']} orders")
+        for row in category_perf.itertuples(index=False):
+            st.metric(row.category, f"${row.item_revenue:,.0f}", f"{row.orders} orders")
 
     st.info(
         rf"**Observation**: Revenue is more or less evenly balanced across categories: Real Estate 30.6%, Business 30%, Personal 23.2%, IP 16.2%"
     )
 
     st.subheader("Top Products by Revenue")
-    top_products = (df.groupby(["product_name", "category"]).agg(item_revenue=("item_revenue", "sum"),
-            quantity = ("quantity",    "sum"),).reset_index().sort_values("item_revenue", ascending=False).head(10))
-
-    fig = px.bar(top_products, x="product_name", y="item_revenue", color="category",
-                 title="Top 10 Products by Revenue", color_discrete_map=category_colors)
-    fig.update_layout(xaxis_tickangle=45)
+    top_products = load_product_revenue(10)
+
+    fig = go.Figure(
+        [go.Bar(x=group["product_name"].to_numpy(), y=group["item_revenue"].to_numpy(),
+                name=category, marker_color=category_colors.get(category, other_color),
+                hovertemplate=f"category={category}<br>product_name=%{{x}}<br>item_revenue=%{{y}}<extra></extra>")
+         for category, group in top_products.groupby("category", sort=False)],
+        layout=dict(title="Top 10 Products by Revenue", xaxis_title="product_name",
+                    yaxis_title="item_revenue", legend_title_text="category", barmode="relative",
+                    xaxis_tickangle=45),
+    )
     st.plotly_chart(fig, use_container_width=True)
 
     st.info(
@@ -230,16 +484,15 @@ def insights_page(df: pd.DataFrame) -> None:
 
 def main() -> None:
     set_page_config()
-    df = load_data()
     st.title("📑 Legal Desk Analytics Dashboard")
     st.sidebar.header("Navigation")
     page = st.sidebar.radio("Go to", ["Overview", "Required Analysis", "Additional Analysis"])
     if page == "Overview":
-        overview_page(df)
+        overview_page()
     elif page == "Required Analysis":
-        analysis_page(df)
+        analysis_page()
     elif page == "Additional Analysis":
-        insights_page(df)
+        insights_page()
 
 if __name__ == "__main__":
     main()